@@ -1,82 +1,65 @@
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-import math
+from matplotlib.animation import FuncAnimation, FFMpegWriter
+import numpy as np
 import pandas
 
 
 class MatAnimation:
     def __init__(self, ax, bars_to_display, users, titles):
         self.ax = ax
-        self.bars_to_display = bars_to_display
         self.users = users
         self.titles = titles
 
+        # Every artist is created once here, and animate_frame only moves them about.
+        user_count = len(users.names)
+        style_graph(ax)
+        ax.set_yticks([])  # Names are drawn as text instead, so they can move with their bar.
+        self.bars = ax.barh(y=[0] * user_count, width=[0] * user_count, color=users.colors)
+        # x is in axes coordinates and y in data coordinates, so names sit where the tick labels would.
+        self.name_texts = [ax.text(-0.01, 0, name, transform=ax.get_yaxis_transform(), horizontalalignment="right", verticalalignment="center", size=8) for name in users.names]
+        self.count_texts = [ax.text(0, 0, "", verticalalignment="center") for _ in users.names]
+        self.title_text = ax.text(0.95, 0.15, "", transform=ax.transAxes, horizontalalignment="right", size=22)
+
+        # The range of bars shown never changes, so this is set once rather than every frame.
+        self.top = user_count+0.5
+        self.bottom = self.top - bars_to_display
+        ax.set_ylim(self.bottom, self.top)  # Range of bars to show. This is offset by -0.5 so we don't cut the bars in half.
+
+        # Work out what animate_frame needs for every frame at once, so each frame only has to read a row.
+        self.shown = users.counts != 0
+        # Text isn't clipped to the axes, so hide the labels of bars that are off the graph.
+        self.labelled = self.shown & (self.bottom < users.y_pos) & (users.y_pos < self.top)
+        self.rounded_counts = np.rint(users.counts).astype(np.int64)
+        self.x_limits = np.maximum(users.counts.max(axis=1), 1) * 1.05  # The bars don't autoscale the graph, so grow it with them.
+
     def animate_frame(self, frame_num):
-        self.ax.clear()
-        style_graph(self.ax)
-        #frame = self.frames[frame_num]
-        positions = []
-        bar_sizes = []
-        cols = []
-        labels = []
-        self.ax.text(0.95, 0.15, self.titles[frame_num], transform=self.ax.transAxes, horizontalalignment="right", size=22)
-        for user in self.users:
-            y_pos = user.y_pos[frame_num]
-            count = user.count[frame_num]
-            if count == 0:
-                continue
-
-            cols.append(user.color)
-            labels.append(user.name)
-            bar_sizes.append(count)
-            positions.append(y_pos)
-            #if self.bars_to_display > y_pos > 0:  # Python 3.9 added this, and PyCharm wants me to use it.
-            self.ax.text(count + 3, y_pos, round(count), verticalalignment="center")
-
-        self.ax.barh(y=positions, width=bar_sizes, color=cols, tick_label=labels)
-        #print(self.ax.get_ylim())
-        #print(len(self.users))
-        top = len(self.users)+0.5
-        bottom = top - self.bars_to_display
-        self.ax.set_ylim(bottom, top)  # Range of bars to show. This is offset by -0.5 so we don't cut the bars in half.
-        #self.ax.set_title(self.titles[frame_num])
-        return [self.ax]
-
-
-class User:
-    """Each user tracks their own animation data."""
-    interp_per_update = 1/10  # How many frames it takes for the animation to complete.
-
-    def __init__(self, name=None, color=None, default_pos=11):
-        self.name = name  # Username
-        self.color = color  # Colour of their bar. This is assigned by ColorTracker.get_color()
-
-        self.count = []  # Number of messages
-        self.y_pos = []  # Used by AnimationFrame
-
-        # Used to interpolate towards new y positions.
-        self.interp_pos = 0  # How far
-        self.last_pos = None
-        self.target_pos = default_pos
-
-    def update_y_pos(self, position):
-        if not self.y_pos:  # Initialization
-            self.y_pos.append(position)
-            self.last_pos = position
-            self.target_pos = position
-
-        if position == self.target_pos:  # Target hasn't changed.
-            if self.interp_pos >= 1:  # Target reached
-                self.y_pos.append(self.target_pos)
-            else:
-                self.interp_pos += self.interp_per_update
-                self.y_pos.append(slerp(self.last_pos, self.target_pos, self.interp_pos))
-        else:  # New target acquired.
-            self.last_pos = self.y_pos[-1]
-            self.target_pos = position
-            #self.interp_pos = abs((self.y_pos[-1] - self.last_pos) / (self.target_pos - self.last_pos))
-            self.interp_pos = 0
-            self.update_y_pos(position)
+        self.title_text.set_text(self.titles[frame_num])
+        # tolist() gives plain Python numbers, which matplotlib handles much faster than numpy scalars.
+        frame = zip(self.users.counts[frame_num].tolist(), self.users.y_pos[frame_num].tolist(), self.shown[frame_num].tolist(),
+                    self.labelled[frame_num].tolist(), self.rounded_counts[frame_num].tolist())
+        for bar, name_text, count_text, (count, y_pos, shown, labelled, rounded_count) in zip(self.bars, self.name_texts, self.count_texts, frame):
+            bar.set_width(count)
+            bar.set_y(y_pos - bar.get_height() / 2)
+            bar.set_visible(shown)
+            name_text.set_y(y_pos)
+            name_text.set_visible(labelled)
+            count_text.set_position((count + 3, y_pos))
+            count_text.set_text(rounded_count)
+            count_text.set_visible(labelled)
+
+        self.ax.set_xlim(0, self.x_limits[frame_num])
+        return [*self.bars, *self.name_texts, *self.count_texts, self.title_text]
+
+
+class Users:
+    """Tracks the animation data of every user. Each array has a row per frame and a column per user."""
+
+    def __init__(self, names, colors, counts, y_pos):
+        self.names = names  # Usernames
+        self.colors = colors  # Colour of each user's bar. This is assigned by get_colors()
+
+        self.counts = counts  # Number of messages
+        self.y_pos = y_pos  # Position of each user's bar. Calculated by get_y_positions()
 
 
 def lerp(a, b, t):
@@ -84,8 +67,8 @@ def lerp(a, b, t):
 
 
 def slerp(a, b, t):
-    deg = t * 90
-    new_t = math.sin(math.radians(deg))
+    """Eases from a to b, slowing down towards the end. Works on whole arrays as well as single values."""
+    new_t = np.sin(t * np.pi / 2)
     return lerp(a, b, new_t)
 
 
@@ -95,31 +78,78 @@ def style_graph(ax):
     ax.tick_params(labelsize=8, length=5)
     ax.grid(True, axis='x', color='white')
     ax.set_axisbelow(True)
-    [spine.set_visible(False) for spine in ax.spines.values()]
+    for spine in ax.spines.values():
+        spine.set_visible(False)
 
 
 def prepare_dataframe(dataframe, expand_factor):
-    # Expand out the dataframe
-    dataframe = dataframe.reset_index()  # Not certain what this does but it's vital.
-    dataframe.index = dataframe.index * expand_factor  # Change indexes from 0,1,2... to 0,30,60...
-    last_index = dataframe.index[-1] + 1
-    dataframe = dataframe.reindex(range(last_index))  # Inset empty rows between new indexes.
-    dataframe["date"] = dataframe["date"].fillna(method="ffill")  # Fill in column
+    """Expands the keyed frames out to every frame of the animation.
+    Returns the user names, the date of each frame, and the message counts with a row per frame and a column per user.
+    """
+    user_names = dataframe.columns.values.tolist()
+    # Each date is shown until the next keyed frame, and the last one only on the final frame.
+    frame_count = (len(dataframe) - 1) * expand_factor + 1
+    dates = np.repeat(dataframe.index.to_numpy(), expand_factor)[:frame_count].tolist()
 
     # Interpolate values
-    dataframe = dataframe.interpolate()
-    #dataframe = dataframe.round()  # We can't have a fraction of a message.
+    counts = expand_keyed_frames(dataframe.to_numpy(dtype=np.float64), expand_factor)
+    #counts = counts.round()  # We can't have a fraction of a message.
+
+    return user_names, dates, counts
+
+
+def expand_keyed_frames(keyed_counts, frames_per_keyed_frame):
+    """Linearly interpolates the counts between each keyed frame.
+    keyed_counts - Array of message counts, with a row per keyed frame and a column per user.
+    """
+    frames = np.arange((len(keyed_counts) - 1) * frames_per_keyed_frame + 1)
+    before = frames // frames_per_keyed_frame  # The keyed frame each frame comes after.
+    after = np.minimum(before + 1, len(keyed_counts) - 1)
+    t = (frames % frames_per_keyed_frame / frames_per_keyed_frame)[:, None]
+    return lerp(keyed_counts[before], keyed_counts[after], t)
+
+
+def get_rankings(counts):
+    """Ranks the users in each frame, from 1 for the fewest messages up. Ties go to whoever comes first.
+    counts - Array of message counts, with a row per frame and a column per user.
+    """
+    # argsort of an argsort gives the rank of each item. A stable sort keeps ties in their original order.
+    whole_counts = counts.astype(np.int64)
+    return whole_counts.argsort(axis=1, kind="stable").argsort(axis=1) + 1
+
+
+def get_y_positions(rankings, frames_to_move=10):
+    """Moves each bar towards its user's ranking, easing it into place whenever the ranking changes.
+    rankings - Array from get_rankings, with a row per frame and a column per user.
+    frames_to_move - How many frames it takes a bar to reach its new position.
+    """
+    rankings = rankings.astype(np.float64)
+    frames = np.arange(len(rankings))[:, None]
+    changed = np.zeros(rankings.shape, dtype=bool)
+    changed[1:] = rankings[1:] != rankings[:-1]
+
+    # The frame each bar started moving towards its current ranking, and how far along it is.
+    move_start = np.where(changed, frames, 0)
+    np.maximum.accumulate(move_start, axis=0, out=move_start)
+    progress = np.minimum((frames - move_start + 1) / frames_to_move, 1)
+
+    # A bar moves from wherever it was, which might be part way towards its last ranking.
+    # That depends on the move before it, so the frames where rankings change are worked out in order.
+    start_pos = rankings.copy()
+    for frame, user in zip(*np.nonzero(changed)):
+        last_start = move_start[frame - 1, user]
+        start_pos[frame, user] = slerp(start_pos[last_start, user], rankings[frame - 1, user], progress[frame - 1, user])
+    start_pos = start_pos[move_start, np.arange(rankings.shape[1])]  # Carry each start across the frames of its move.
 
-    return dataframe
+    return slerp(start_pos, rankings, progress)
 
 
 def get_colors(color_map, count):
     """Gets a list of colours to be used in matplotlib
     # See for colour mappings https://matplotlib.org/stable/gallery/color/colormap_reference.html
     """
-    cols = plt.get_cmap(color_map, count + 1)  # +1 to prevent wrapping, where col 0 is same as col -1
-    cols = cols(range(count + 1)).tolist()  # Create a list of colours
-    return cols[:-1]  # Remove overlapping colour and return
+    # endpoint=False prevents wrapping, where col 0 would be the same as col -1
+    return plt.get_cmap(color_map)(np.linspace(0, 1, count, endpoint=False))
 
 
 def main(path, frames_per_keyed_frame, users_to_display):
@@ -127,22 +157,10 @@ def main(path, frames_per_keyed_frame, users_to_display):
     data_file_path - Path to the .csv file containing
     """
     dataframe = pandas.read_csv(path, index_col="date")
-    dataframe = prepare_dataframe(dataframe, frames_per_keyed_frame)
-    user_cols = dataframe.columns.values.tolist()[1:]  # Removes date column
-    users = [User(name=x, default_pos=-users_to_display) for x in user_cols]  # A list of all Users being tracked.
-    # Give users colours
-    cols = get_colors("twilight_shifted", len(users))
-    for user, col in zip(users, cols):
-        user.color = col
-
-    dates = []
-    for index, row in dataframe.iterrows():
-        dates.append(row[0])
-        row = row[1:]  # Removes date column
-        rankings = pandas.Series(row, dtype="int64").rank(method="first")
-        for user, count, ranking in zip(users, row, rankings):
-            user.count.append(count)
-            user.update_y_pos(ranking)
+    user_names, dates, counts = prepare_dataframe(dataframe, frames_per_keyed_frame)
+    counts = counts.astype(np.float32)
+    y_positions = get_y_positions(get_rankings(counts)).astype(np.float32)
+    users = Users(user_names, get_colors("twilight_shifted", len(user_names)), counts, y_positions)
 
     fig = plt.Figure(figsize=(7, 6), dpi=144)
     ax = fig.add_subplot()
@@ -151,10 +169,15 @@ def main(path, frames_per_keyed_frame, users_to_display):
     #fig.savefig("test.png")
     #return
 
-    frame_num = dataframe.shape[0]
-    frame_duration = (1 / 30) * 1000  # How long each frame lasts.
-    anim = FuncAnimation(fig=fig, func=animator.animate_frame, frames=frame_num, interval=frame_duration, repeat=False)
-    anim.save("test.mp4")
+    frame_num = len(dates)
+    frame_rate = 30
+    frame_duration = (1 / frame_rate) * 1000  # How long each frame lasts.
+    # No blitting. It only affects live display, since save() always draws whole frames. The x limits also grow every
+    # frame, which changes the ticks and grid that blitting would keep in its cached background.
+    anim = FuncAnimation(fig=fig, func=animator.animate_frame, frames=frame_num, interval=frame_duration, repeat=False, cache_frame_data=False)
+    # Frames are piped straight into ffmpeg, and the fastest x264 preset keeps encoding from holding up drawing.
+    writer = FFMpegWriter(fps=frame_rate, codec="libx264", extra_args=["-preset", "ultrafast", "-pix_fmt", "yuv420p"])
+    anim.save("test.mp4", writer=writer)
 
 
 if __name__ == "__main__":
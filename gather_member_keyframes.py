@@ -2,7 +2,8 @@ import discord
 from discord.ext import commands
 import datetime  # Used for timestamps
 from collections import Counter  # Used to count the users.
-import json  # Used to create the file the animation software uses.
+import heapq  # Used to find the top users.
+import pandas  # Used to write the .csv file.
 
 
 class Admin(commands.Cog, name="admin"):
@@ -19,6 +20,7 @@ class Admin(commands.Cog, name="admin"):
         capture_interval = 24*60*60  # How regularly, in seconds, to capture the state of the counter.
         output_path = "top_members.csv"  # Where to save the data to.
         date_format = "%Y-%m-%d"  # Currently set to year-month-day. See datetime.strftime for formatting options.
+        max_keyed_frames = 60  # Stops early after capturing this many keyed frames.
 
         # This system of copying the counters is a bit memory inefficient.
         # There might be more efficient ways to do this, but until it's an issue it's fine.
@@ -32,48 +34,58 @@ class Admin(commands.Cog, name="admin"):
         first_message = first_message[0]
         c[first_message.author.name] += 1  # Add this message to the counter.
         start_snowflake = first_message.id
-        # ==== Tally messages ====
-        while True:  # For me, this takes around 7 seconds each loop to search 1000 messages
-            end_snowflake = add_to_snowflake(start_snowflake, capture_interval)  # One day later...
-
-            # We've caught up to the current day!
-            if discord.utils.snowflake_time(start_snowflake) >= datetime.datetime.now():
-                break
-
-            # Count each message for each person on this day...
-            async for message in ctx.channel.history(limit=None, after=discord.Object(start_snowflake), before=discord.Object(end_snowflake), oldest_first=True):
-                c[message.author.name] += 1
-                message_count += 1
+        current_tops = []  # Users who were in the top_users at the last capture.
+        touched_users = {first_message.author.name}  # Users who have sent a message since the last capture.
+        first_seen = {first_message.author.name: 0}  # The order users sent their first message in. Used to break ties.
 
+        def capture_keyed_frame(start_time):
+            """Records the state of the counter for the capture starting at start_time."""
+            nonlocal current_tops
             # Record which users are in the top_users
-            current_tops = c.most_common(top_users)
-            for user in current_tops:
-                tracked_users.add(user[0])
+            # Counts only go up, so only the last top_users and anyone who's spoken since can be in it now.
+            # nlargest keeps the order of ties, so like Counter.most_common they go to whoever spoke first.
+            candidates = sorted(touched_users.union(current_tops), key=first_seen.__getitem__)
+            current_tops = heapq.nlargest(top_users, candidates, key=c.__getitem__)
+            touched_users.clear()
+            tracked_users.update(current_tops)
 
             # Record the counter and date
-            current_date = discord.utils.snowflake_time(start_snowflake).strftime(date_format)
+            current_date = start_time.strftime(date_format)
             keyed_frames.append((current_date, c.copy()))
 
-            # Loop handling
-            start_snowflake = end_snowflake
-            if len(keyed_frames) >= 60:
+        # ==== Tally messages ====
+        # The whole channel is read in one go, rather than asking Discord for each day separately.
+        end_snowflake = add_to_snowflake(start_snowflake, capture_interval)  # One day later...
+        async for message in ctx.channel.history(limit=None, after=first_message, oldest_first=True):
+            # This message is past the end of the current capture, so record it and any empty days after it.
+            while message.id >= end_snowflake and len(keyed_frames) < max_keyed_frames:
+                capture_keyed_frame(discord.utils.snowflake_time(start_snowflake))
+                start_snowflake = end_snowflake
+                end_snowflake = add_to_snowflake(start_snowflake, capture_interval)
+            if len(keyed_frames) >= max_keyed_frames:
+                break
+
+            c[message.author.name] += 1
+            touched_users.add(message.author.name)
+            first_seen.setdefault(message.author.name, len(first_seen))
+            message_count += 1
+
+        # Record the days between the last message and now.
+        now = datetime.datetime.now()
+        while len(keyed_frames) < max_keyed_frames:
+            start_time = discord.utils.snowflake_time(start_snowflake)
+            if start_time >= now:  # We've caught up to the current day!
                 break
+            capture_keyed_frame(start_time)
+            start_snowflake = add_to_snowflake(start_snowflake, capture_interval)
 
         # ==== Create the .csv file ====
-        tracked_users = sorted(list(tracked_users))
-        with open(output_path, "w", encoding="utf-8") as f:
-            name_list = ",".join(tracked_users)
-            f.write(f"date,{name_list}\n")
-            for keyed_frame in keyed_frames:
-                counter = keyed_frame[1]
-                user_data = []
-                for user in tracked_users:
-                    if user in counter:
-                        user_data.append(counter[user])
-                    else:
-                        user_data.append(0)
-                user_data_text = ",".join(str(x) for x in user_data)
-                f.write(f"{keyed_frame[0]},{user_data_text}\n")
+        tracked_users = sorted(tracked_users)
+        # Users missing from a counter haven't sent a message yet, so they're filled in with 0.
+        dataframe = pandas.DataFrame([keyed_frame[1] for keyed_frame in keyed_frames], columns=tracked_users)
+        dataframe = dataframe.fillna(0).astype("int64")
+        dataframe.insert(0, "date", [keyed_frame[0] for keyed_frame in keyed_frames])
+        dataframe.to_csv(output_path, index=False, encoding="utf-8")
 
         #await ctx.send("Got")
         print("done")